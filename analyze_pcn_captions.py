@@ -9,20 +9,20 @@ to identify:
 3. Count instances with/without captions for each split (test, train, val)
 """
 
-import os
-import csv
-import pandas as pd
 from pathlib import Path
-from collections import defaultdict
+from collections import Counter, defaultdict
 import argparse
 
+from pcn_index import CACHE_DIR, index_captions_by_class, load_captions, scan_pcn
 
-def load_caption_data(csv_path):
+
+def load_caption_data(csv_path, use_cache=True):
     """
     Load caption data from CSV file.
     
     Args:
         csv_path (str): Path to the Cap3D CSV file
+        use_cache (bool): Reuse the parsed CSV from CACHE_DIR if unchanged
         
     Returns:
         dict: Dictionary mapping 'class_id_instance_id' to caption
@@ -30,21 +30,11 @@ def load_caption_data(csv_path):
     """
     print(f"Loading caption data from {csv_path}...")
     
-    captions = {}
-    class_ids = set()
-    
     try:
-        with open(csv_path, 'r', encoding='utf-8') as f:
-            csv_reader = csv.reader(f)
-            for row in csv_reader:
-                if len(row) >= 2:
-                    instance_id = row[0].strip()
-                    caption = row[1].strip()
-                    captions[instance_id] = caption
-                    
-                    # Extract class_id from instance_id
-                    class_id = instance_id.split('_')[0]
-                    class_ids.add(class_id)
+        captions = load_captions(csv_path, use_cache=use_cache)
+        
+        # Extract class_id from instance_id
+        class_ids = {instance_id.partition('_')[0] for instance_id in captions}
         
         print(f"✓ Loaded {len(captions)} captions for {len(class_ids)} classes")
         return captions, class_ids
@@ -54,12 +44,13 @@ def load_caption_data(csv_path):
         return {}, set()
 
 
-def get_pcn_instances(pcn_base_path):
+def get_pcn_instances(pcn_base_path, use_cache=True):
     """
     Get all PCN instances from the complete folders.
     
     Args:
         pcn_base_path (str): Path to the PCN dataset base directory
+        use_cache (bool): Reuse the previous scan from CACHE_DIR if unchanged
         
     Returns:
         dict: Dictionary with structure {split: {class_id: [instance_ids]}}
@@ -67,46 +58,39 @@ def get_pcn_instances(pcn_base_path):
     """
     print(f"Scanning PCN dataset at {pcn_base_path}...")
     
-    pcn_instances = {'test': {}, 'train': {}, 'val': {}}
+    pcn_instances = scan_pcn(pcn_base_path, use_cache=use_cache)
     all_class_ids = set()
     
-    splits = ['test', 'train', 'val']
-    
-    for split in splits:
+    for split in ['test', 'train', 'val']:
         complete_path = Path(pcn_base_path) / split / 'complete'
         
         if not complete_path.exists():
             print(f"⚠️  Warning: {complete_path} does not exist")
             continue
-            
-        print(f"  Processing {split} split...")
         
-        # Get all class directories
-        class_dirs = [d for d in complete_path.iterdir() if d.is_dir()]
+        print(f"  Processing {split} split...")
         
-        for class_dir in class_dirs:
-            class_id = class_dir.name
+        for class_id, instance_ids in pcn_instances[split].items():
             all_class_ids.add(class_id)
             
-            # Get all .pcd files in this class directory
-            pcd_files = list(class_dir.glob('*.pcd'))
-            instance_ids = [f.stem for f in pcd_files]  # filename without extension
-            
-            pcn_instances[split][class_id] = instance_ids
-            
             print(f"    Class {class_id}: {len(instance_ids)} instances")
     
     print(f"✓ Found {len(all_class_ids)} classes in PCN dataset")
     return pcn_instances, all_class_ids
 
 
-def analyze_missing_captions(pcn_instances, captions):
+_EMPTY = frozenset()
+
+
+def analyze_missing_captions(pcn_instances, captions, collect_lists=True):
     """
     Find PCN instances without captions and vice versa.
     
     Args:
         pcn_instances (dict): PCN instances by split and class
         captions (dict): Caption data
+        collect_lists (bool): Also collect the per-instance id lists, which
+            are only needed by save_detailed_results
         
     Returns:
         dict: Analysis results
@@ -116,44 +100,45 @@ def analyze_missing_captions(pcn_instances, captions):
     results = {
         'pcn_without_caption': {'test': {}, 'train': {}, 'val': {}},
         'caption_without_pcn': {},
+        'caption_without_pcn_stats': {},
         'stats_by_split': {'test': {}, 'train': {}, 'val': {}},
         'total_stats': {}
     }
     
+    # Membership is only ever asked per class, so probe small per-class sets
+    # instead of the flat caption dict and never build a full-id string
+    captions_by_class = index_captions_by_class(captions)
+    pcn_by_class = defaultdict(set)
+    
     # Find PCN instances without captions
     for split in ['test', 'train', 'val']:
         for class_id, instance_ids in pcn_instances[split].items():
-            missing_captions = []
-            with_captions = []
+            class_captions = captions_by_class.get(class_id, {})
+            pcn_by_class[class_id].update(instance_ids)
             
-            for instance_id in instance_ids:
-                full_instance_id = f"{class_id}_{instance_id}"
-                
-                if full_instance_id in captions:
-                    with_captions.append(instance_id)
-                else:
-                    missing_captions.append(instance_id)
+            total = len(instance_ids)
+            with_caption = len(class_captions.keys() & instance_ids)
             
-            results['pcn_without_caption'][split][class_id] = missing_captions
+            if collect_lists:
+                results['pcn_without_caption'][split][class_id] = [
+                    instance_id for instance_id in instance_ids if instance_id not in class_captions]
             results['stats_by_split'][split][class_id] = {
-                'total': len(instance_ids),
-                'with_caption': len(with_captions),
-                'without_caption': len(missing_captions)
+                'total': total,
+                'with_caption': with_caption,
+                'without_caption': total - with_caption
             }
     
-    # Find captions without PCN instances
-    all_pcn_instances = set()
-    for split in ['test', 'train', 'val']:
-        for class_id, instance_ids in pcn_instances[split].items():
-            for instance_id in instance_ids:
-                all_pcn_instances.add(f"{class_id}_{instance_id}")
-    
-    for instance_id in captions.keys():
-        if instance_id not in all_pcn_instances:
-            class_id = instance_id.split('_')[0]
-            if class_id not in results['caption_without_pcn']:
-                results['caption_without_pcn'][class_id] = []
-            results['caption_without_pcn'][class_id].append(instance_id)
+    # Find captions without PCN instances, in file order so the report
+    # follows the CSV
+    orphan_stats = results['caption_without_pcn_stats']
+    for key in captions:
+        class_id, sep, instance_id = key.partition('_')
+        if sep and instance_id in pcn_by_class.get(class_id, _EMPTY):
+            continue
+        
+        orphan_stats[class_id] = orphan_stats.get(class_id, 0) + 1
+        if collect_lists:
+            results['caption_without_pcn'].setdefault(class_id, []).append(key)
     
     return results
 
@@ -176,28 +161,29 @@ def print_detailed_report(results, captions, class_ids_csv, class_ids_pcn):
     print(f"  • Classes only in PCN: {len(class_ids_pcn - class_ids_csv)}")
     
     # Captions without PCN instances
-    total_captions_without_pcn = sum(len(instances) for instances in results['caption_without_pcn'].values())
+    total_captions_without_pcn = sum(results['caption_without_pcn_stats'].values())
     print(f"  • Captions without PCN instances: {total_captions_without_pcn:,}")
     
+    # Accumulate split and class totals in a single pass over the stats
+    per_split_totals = {}
+    per_class_totals = defaultdict(Counter)
+    for split in ['test', 'train', 'val']:
+        split_totals = per_split_totals[split] = Counter()
+        for class_id, stats in results['stats_by_split'][split].items():
+            split_totals.update(stats)
+            per_class_totals[class_id].update(stats)
+    overall_totals = sum(per_split_totals.values(), Counter())
+    
     # Statistics by split
     print("\n📈 STATISTICS BY SPLIT:")
-    total_with_caption = 0
-    total_without_caption = 0
-    total_instances = 0
+    total_with_caption = overall_totals['with_caption']
+    total_without_caption = overall_totals['without_caption']
+    total_instances = overall_totals['total']
     
     for split in ['test', 'train', 'val']:
-        split_with_caption = 0
-        split_without_caption = 0
-        split_total = 0
-        
-        for class_id, stats in results['stats_by_split'][split].items():
-            split_with_caption += stats['with_caption']
-            split_without_caption += stats['without_caption']
-            split_total += stats['total']
-        
-        total_with_caption += split_with_caption
-        total_without_caption += split_without_caption
-        total_instances += split_total
+        split_with_caption = per_split_totals[split]['with_caption']
+        split_without_caption = per_split_totals[split]['without_caption']
+        split_total = per_split_totals[split]['total']
         
         print(f"\n  {split.upper()} SPLIT:")
         print(f"    • Total instances: {split_total:,}")
@@ -214,38 +200,39 @@ def print_detailed_report(results, captions, class_ids_csv, class_ids_pcn):
     print(f"{'Class ID':<12} {'Test':<8} {'Train':<8} {'Val':<8} {'Total':<8} {'With Caption':<12} {'Missing':<12}")
     print("-" * 80)
     
-    all_classes = set()
-    for split in ['test', 'train', 'val']:
-        all_classes.update(results['stats_by_split'][split].keys())
+    test_split, train_split, val_split = (results['stats_by_split'][split] for split in ['test', 'train', 'val'])
+    empty_stats = {'total': 0, 'with_caption': 0, 'without_caption': 0}
     
-    for class_id in sorted(all_classes):
-        test_stats = results['stats_by_split']['test'].get(class_id, {'total': 0, 'with_caption': 0, 'without_caption': 0})
-        train_stats = results['stats_by_split']['train'].get(class_id, {'total': 0, 'with_caption': 0, 'without_caption': 0})
-        val_stats = results['stats_by_split']['val'].get(class_id, {'total': 0, 'with_caption': 0, 'without_caption': 0})
-        
-        total_instances = test_stats['total'] + train_stats['total'] + val_stats['total']
-        total_with_caption = test_stats['with_caption'] + train_stats['with_caption'] + val_stats['with_caption']
-        total_without_caption = test_stats['without_caption'] + train_stats['without_caption'] + val_stats['without_caption']
+    rows = []
+    for class_id in sorted(per_class_totals):
+        class_totals = per_class_totals[class_id]
+        total_instances = class_totals['total']
         
         if total_instances > 0:  # Only show classes that exist in PCN
-            print(f"{class_id:<12} {test_stats['total']:<8} {train_stats['total']:<8} {val_stats['total']:<8} {total_instances:<8} {total_with_caption:<12} {total_without_caption:<12}")
+            rows.append(' '.join([
+                class_id.ljust(12),
+                str(test_split.get(class_id, empty_stats)['total']).ljust(8),
+                str(train_split.get(class_id, empty_stats)['total']).ljust(8),
+                str(val_split.get(class_id, empty_stats)['total']).ljust(8),
+                str(total_instances).ljust(8),
+                str(class_totals['with_caption']).ljust(12),
+                str(class_totals['without_caption']).ljust(12),
+            ]))
+    if rows:
+        print('\n'.join(rows))
     
     # Classes only in CSV
-    if results['caption_without_pcn']:
+    if results['caption_without_pcn_stats']:
         print(f"\n⚠️  CLASSES WITH CAPTIONS BUT NO PCN INSTANCES:")
-        for class_id, instances in results['caption_without_pcn'].items():
-            print(f"    {class_id}: {len(instances)} captions")
+        for class_id, count in results['caption_without_pcn_stats'].items():
+            print(f"    {class_id}: {count} captions")
     
     # Classes only in PCN
     pcn_only_classes = class_ids_pcn - class_ids_csv
     if pcn_only_classes:
         print(f"\n⚠️  CLASSES IN PCN BUT NOT IN CSV:")
         for class_id in sorted(pcn_only_classes):
-            total_instances = 0
-            for split in ['test', 'train', 'val']:
-                if class_id in results['stats_by_split'][split]:
-                    total_instances += results['stats_by_split'][split][class_id]['total']
-            print(f"    {class_id}: {total_instances} instances")
+            print(f"    {class_id}: {per_class_totals[class_id]['total']} instances")
 
 
 def save_detailed_results(results, output_dir):
@@ -255,32 +242,33 @@ def save_detailed_results(results, output_dir):
     output_path = Path(output_dir)
     output_path.mkdir(exist_ok=True)
     
-    # Save instances without captions by split
+    # Save instances without captions by split. Each file is formatted into
+    # one list of lines and handed to the buffered writer in a single call
     for split in ['test', 'train', 'val']:
         filename = output_path / f"pcn_without_captions_{split}.txt"
-        with open(filename, 'w') as f:
-            f.write(f"PCN instances without captions - {split} split\n")
-            f.write("="*50 + "\n\n")
-            
-            for class_id, instances in results['pcn_without_caption'][split].items():
-                if instances:
-                    f.write(f"Class {class_id} ({len(instances)} instances):\n")
-                    for instance in instances:
-                        f.write(f"  {class_id}_{instance}\n")
-                    f.write("\n")
+        lines = [f"PCN instances without captions - {split} split\n", "="*50 + "\n\n"]
+        
+        for class_id, instances in results['pcn_without_caption'][split].items():
+            if instances:
+                lines.append(f"Class {class_id} ({len(instances)} instances):\n")
+                lines.extend(f"  {class_id}_{instance}\n" for instance in instances)
+                lines.append("\n")
+        
+        with open(filename, 'w', buffering=1 << 20) as f:
+            f.writelines(lines)
     
     # Save captions without PCN instances
     if results['caption_without_pcn']:
         filename = output_path / "captions_without_pcn.txt"
-        with open(filename, 'w') as f:
-            f.write("Captions without corresponding PCN instances\n")
-            f.write("="*50 + "\n\n")
-            
-            for class_id, instances in results['caption_without_pcn'].items():
-                f.write(f"Class {class_id} ({len(instances)} captions):\n")
-                for instance in instances:
-                    f.write(f"  {instance}\n")
-                f.write("\n")
+        lines = ["Captions without corresponding PCN instances\n", "="*50 + "\n\n"]
+        
+        for class_id, instances in results['caption_without_pcn'].items():
+            lines.append(f"Class {class_id} ({len(instances)} captions):\n")
+            lines.extend(f"  {instance}\n" for instance in instances)
+            lines.append("\n")
+        
+        with open(filename, 'w', buffering=1 << 20) as f:
+            f.writelines(lines)
     
     print(f"\n💾 Detailed results saved to {output_path}")
 
@@ -298,19 +286,21 @@ def main():
                        help='Directory to save detailed results')
     parser.add_argument('--save_results', action='store_true',
                        help='Save detailed results to files')
+    parser.add_argument('--no-cache', dest='use_cache', action='store_false',
+                       help=f'Re-parse the CSV and re-scan PCN instead of using {CACHE_DIR}')
     
     args = parser.parse_args()
     
     # Load data
-    captions, class_ids_csv = load_caption_data(args.csv_path)
-    pcn_instances, class_ids_pcn = get_pcn_instances(args.pcn_path)
+    captions, class_ids_csv = load_caption_data(args.csv_path, use_cache=args.use_cache)
+    pcn_instances, class_ids_pcn = get_pcn_instances(args.pcn_path, use_cache=args.use_cache)
     
     if not captions or not pcn_instances:
         print("❌ Failed to load data. Please check file paths.")
         return
     
     # Analyze
-    results = analyze_missing_captions(pcn_instances, captions)
+    results = analyze_missing_captions(pcn_instances, captions, collect_lists=args.save_results)
     
     # Print report
     print_detailed_report(results, captions, class_ids_csv, class_ids_pcn)
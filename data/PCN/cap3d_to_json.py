@@ -1,20 +1,26 @@
-import csv
 import json
+import sys
+from pathlib import Path
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Share the caption reader with the analysis scripts at the repository root
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from pcn_index import read_caption_columns
 
 csv_file = "Cap3D_automated_ShapeNet.csv"
 json_file = "Cap3D_automated_ShapeNet.json"
 
-data_dict = {}
-
-with open(csv_file, newline='', encoding='utf-8') as f:
-    reader = csv.reader(f)
-    for row in reader:
-        if len(row) >= 2:
-            key = row[0].strip()
-            value = row[1].strip()
-            data_dict[key] = value
+# Rows with fewer than two fields are skipped; empty captions are kept as ""
+data_dict = dict(zip(*read_caption_columns(csv_file)))
 
-with open(json_file, "w", encoding='utf-8') as f:
-    json.dump(data_dict, f, indent=2, ensure_ascii=False)
+if orjson is not None:
+    # orjson serializes in C and emits UTF-8 bytes directly
+    Path(json_file).write_bytes(orjson.dumps(data_dict, option=orjson.OPT_INDENT_2))
+else:
+    Path(json_file).write_text(json.dumps(data_dict, indent=2, ensure_ascii=False), encoding='utf-8')
 
-print(f"JSON file saved as {json_file}")
\ No newline at end of file
+print(f"JSON file saved as {json_file}")
@@ -0,0 +1,277 @@
+"""
+Shared loaders for the Cap3D caption CSV and the PCN directory tree.
+
+Both analyze_pcn_captions.py and quick_caption_summary.py read the same CSV
+and walk the same PCN folders, so the parsing, scanning and caching live
+here once. Results are memoized in-process and pickled under CACHE_DIR.
+"""
+
+import os
+import csv
+import functools
+import hashlib
+import pickle
+from pathlib import Path
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pacsv
+except ImportError:
+    pa = None
+
+
+CACHE_DIR = Path(os.environ.get('XDG_CACHE_HOME', Path.home() / '.cache')) / 'pcn_analyze'
+
+# Bump whenever the parsing or scanning rules change so pickles written by
+# older code are not reused
+CACHE_VERSION = 2
+
+
+def file_fingerprint(path):
+    """
+    Fingerprint a single file by its modification time and size.
+    """
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+
+def pcn_tree_fingerprint(pcn_base_path):
+    """
+    Fingerprint a PCN tree by the modification times of its split and class directories.
+    
+    Adding or removing a .pcd file updates the mtime of its class directory,
+    so this changes whenever the scan result would.
+    """
+    fingerprint = [os.stat(pcn_base_path).st_mtime_ns]
+    for split in ['test', 'train', 'val']:
+        complete_path = os.path.join(pcn_base_path, split, 'complete')
+        if not os.path.isdir(complete_path):
+            fingerprint.append((split, None))
+            continue
+        with os.scandir(complete_path) as classes:
+            class_mtimes = tuple(sorted((entry.name, entry.stat().st_mtime_ns)
+                                        for entry in classes if entry.is_dir()))
+        fingerprint.append((split, os.stat(complete_path).st_mtime_ns, class_mtimes))
+    return tuple(fingerprint)
+
+
+def disk_cache(fingerprint):
+    """
+    Memoize a single-path function in memory and as a pickle under CACHE_DIR.
+    
+    The cache key combines CACHE_VERSION, the function, the absolute path
+    and fingerprint(path). Writing a new pickle removes the older ones of
+    the same function. The wrapped function accepts an extra use_cache
+    keyword to bypass both layers.
+    """
+    def decorator(func):
+        # In-process layer keyed on (path, fingerprint), so repeated calls in
+        # one interpreter skip even the pickle load
+        @functools.lru_cache(maxsize=None)
+        def cached(abs_path, key):
+            digest = hashlib.sha1(repr((CACHE_VERSION, func.__module__, func.__qualname__, abs_path, key))
+                                  .encode('utf-8')).hexdigest()
+            cache_file = CACHE_DIR / f"{func.__name__}_{digest}.pkl"
+            
+            try:
+                with open(cache_file, 'rb') as f:
+                    result = pickle.load(f)
+                print(f"  ↺ Using cached result from {cache_file}")
+                return result
+            except (OSError, pickle.UnpicklingError, EOFError):
+                pass
+            
+            result = func(abs_path)
+            
+            try:
+                CACHE_DIR.mkdir(parents=True, exist_ok=True)
+                tmp_file = cache_file.with_suffix(f'.{os.getpid()}.tmp')
+                with open(tmp_file, 'wb') as f:
+                    pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_file, cache_file)
+                
+                # Keep only the newest pickle per function; older versions and
+                # fingerprints would otherwise pile up as full copies
+                for stale_file in CACHE_DIR.glob(f"{func.__name__}_*.pkl"):
+                    if stale_file != cache_file and len(stale_file.stem) == len(cache_file.stem):
+                        stale_file.unlink(missing_ok=True)
+            except OSError as e:
+                print(f"⚠️  Warning: could not write cache file {cache_file}: {e}")
+            
+            return result
+        
+        @functools.wraps(func)
+        def wrapper(path, use_cache=True):
+            if not use_cache:
+                return func(path)
+            
+            try:
+                key = fingerprint(path)
+            except OSError:
+                return func(path)
+            
+            return cached(os.path.abspath(path), key)
+        return wrapper
+    return decorator
+
+
+def _read_caption_rows(csv_path):
+    """
+    Read the id and caption columns row by row with csv.reader.
+    
+    Rows with fewer than two fields are skipped and fields past the second
+    are ignored; an empty caption is kept as ''.
+    """
+    instance_ids = []
+    captions = []
+    with open(csv_path, 'r', encoding='utf-8', newline='') as f:
+        for row in csv.reader(f):
+            if len(row) >= 2:
+                instance_ids.append(row[0].strip())
+                captions.append(row[1].strip())
+    return instance_ids, captions
+
+
+def read_caption_columns(csv_path):
+    """
+    Read the id and caption columns of the Cap3D CSV as two stripped lists.
+    
+    Rows with fewer than two fields are dropped, fields past the second are
+    ignored and an empty caption is kept as ''. Rows come back in file order,
+    so dict(zip(...)) keeps the last caption of a duplicated id.
+    
+    Uses pyarrow's multi-threaded CSV reader when it is installed and falls
+    back to csv.reader otherwise. pandas is not used here because its C
+    parser reads a missing second field and an empty one both as ''.
+    """
+    if pa is not None:
+        # Rows that do not have exactly two fields are handed to this handler.
+        # Short rows are skipped. Long rows (unquoted commas in the caption)
+        # carry no reliable file position when blocks are parsed in parallel,
+        # so seeing one sends the whole file down the csv.reader path below,
+        # which keeps file order and therefore "last duplicate id wins"
+        has_long_rows = False
+        
+        def handle_invalid_row(row):
+            nonlocal has_long_rows
+            if row.actual_columns > row.expected_columns:
+                has_long_rows = True
+            return 'skip'
+        
+        table = pacsv.read_csv(
+            csv_path,
+            read_options=pacsv.ReadOptions(use_threads=True, column_names=['id', 'cap']),
+            # Captions are quoted free text and may contain newlines, which
+            # the block splitter must not cut through
+            parse_options=pacsv.ParseOptions(delimiter=',', newlines_in_values=True,
+                                             invalid_row_handler=handle_invalid_row),
+            convert_options=pacsv.ConvertOptions(
+                column_types={'id': pa.string(), 'cap': pa.string()}))
+        
+        if not has_long_rows:
+            instance_ids = pc.utf8_trim_whitespace(table.column('id')).to_pylist()
+            captions = pc.utf8_trim_whitespace(table.column('cap')).to_pylist()
+            return instance_ids, captions
+    
+    return _read_caption_rows(csv_path)
+
+
+@disk_cache(file_fingerprint)
+def load_captions(csv_path):
+    """
+    Load the Cap3D CSV into a dict mapping 'class_id_instance_id' to caption.
+    
+    Args:
+        csv_path (str): Path to the Cap3D CSV file
+        
+    Returns:
+        dict: Caption for each 'class_id_instance_id'
+    """
+    # Build the dict from both materialized columns in one shot so it is
+    # sized once rather than grown row by row
+    return dict(zip(*read_caption_columns(csv_path)))
+
+
+def _list_class_dirs(complete_path):
+    """
+    List (class_id, class_path) for every class directory under a split.
+    
+    Uses os.scandir so the per-entry type info is taken from the cached
+    DirEntry instead of issuing an extra stat() per entry. Symlinked class
+    directories are followed (only those cost a stat()).
+    """
+    with os.scandir(complete_path) as classes:
+        return [(entry.name, entry.path) for entry in classes if entry.is_dir()]
+
+
+def _scan_class(class_path):
+    """
+    Return the instance ids (.pcd filenames without extension) in a class directory.
+    """
+    with os.scandir(class_path) as entries:
+        return [entry.name[:-4] for entry in entries if entry.name.endswith('.pcd')]
+
+
+@disk_cache(pcn_tree_fingerprint)
+def scan_pcn(pcn_base_path):
+    """
+    Scan the complete folders of every split.
+    
+    Args:
+        pcn_base_path (str): Path to the PCN dataset base directory
+        
+    Returns:
+        dict: Dictionary with structure {split: {class_id: [instance_ids]}}
+    """
+    pcn_instances = {'test': {}, 'train': {}, 'val': {}}
+    
+    splits = []
+    complete_paths = []
+    for split in ['test', 'train', 'val']:
+        complete_path = Path(pcn_base_path) / split / 'complete'
+        
+        # Missing splits are reported by the caller, outside the cache
+        if complete_path.exists():
+            splits.append(split)
+            complete_paths.append(complete_path)
+    
+    # Directory listing is I/O bound and os.scandir releases the GIL, so the
+    # splits and then every class directory are scanned concurrently
+    max_workers = min(32, (os.cpu_count() or 1) * 4)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        class_dirs = dict(zip(splits, executor.map(_list_class_dirs, complete_paths)))
+        futures = {
+            split: {class_id: executor.submit(_scan_class, class_path)
+                    for class_id, class_path in class_dirs[split]}
+            for split in splits
+        }
+        
+        for split, class_futures in futures.items():
+            for class_id, future in class_futures.items():
+                pcn_instances[split][class_id] = future.result()
+    
+    return pcn_instances
+
+
+def index_captions_by_class(captions):
+    """
+    Group caption keys into {class_id: {instance_id: key}}.
+    
+    The original key is kept so orphan captions can be reported exactly. A
+    key without '_' gets instance_id None, which no PCN instance can match
+    and which keeps 'abc' and 'abc_' apart.
+    
+    Args:
+        captions (dict): Caption data keyed by 'class_id_instance_id'
+        
+    Returns:
+        dict: Captioned instance_ids (mapped to their keys) for each class_id
+    """
+    captions_by_class = defaultdict(dict)
+    for key in captions:
+        class_id, sep, instance_id = key.partition('_')
+        captions_by_class[class_id][instance_id if sep else None] = key
+    return dict(captions_by_class)
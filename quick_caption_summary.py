@@ -4,14 +4,11 @@ Quick summary script for PCN caption analysis.
 Provides a concise overview of caption coverage.
 """
 
-import os
-import csv
-from pathlib import Path
-from collections import defaultdict
+from pcn_index import index_captions_by_class, load_captions, scan_pcn
 
 
 def quick_summary(csv_path="data/PCN/Cap3D_automated_ShapeNet.csv", 
-                  pcn_path="data/PCN"):
+                  pcn_path="data/PCN", use_cache=True):
     """
     Generate a quick summary of caption coverage.
     """
@@ -19,32 +16,17 @@ def quick_summary(csv_path="data/PCN/Cap3D_automated_ShapeNet.csv",
     print("=" * 50)
     
     # Load captions
-    captions = {}
-    with open(csv_path, 'r') as f:
-        csv_reader = csv.reader(f)
-        for row in csv_reader:
-            if len(row) >= 2:
-                captions[row[0].strip()] = row[1].strip()
+    captions = load_captions(csv_path, use_cache=use_cache)
+    captions_by_class = index_captions_by_class(captions)
     
-    # Count PCN instances
+    # Count PCN instances against each class's caption set
     pcn_counts = {'test': 0, 'train': 0, 'val': 0}
     pcn_with_captions = {'test': 0, 'train': 0, 'val': 0}
     
-    for split in ['test', 'train', 'val']:
-        complete_path = Path(pcn_path) / split / 'complete'
-        if complete_path.exists():
-            for class_dir in complete_path.iterdir():
-                if class_dir.is_dir():
-                    class_id = class_dir.name
-                    pcd_files = list(class_dir.glob('*.pcd'))
-                    
-                    for pcd_file in pcd_files:
-                        instance_id = pcd_file.stem
-                        full_id = f"{class_id}_{instance_id}"
-                        
-                        pcn_counts[split] += 1
-                        if full_id in captions:
-                            pcn_with_captions[split] += 1
+    for split, split_instances in scan_pcn(pcn_path, use_cache=use_cache).items():
+        for class_id, instance_ids in split_instances.items():
+            pcn_counts[split] += len(instance_ids)
+            pcn_with_captions[split] += len(captions_by_class.get(class_id, {}).keys() & instance_ids)
     
     # Print summary
     total_pcn = sum(pcn_counts.values())